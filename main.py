@@ -1,78 +1,228 @@
+import codecs
+import fnmatch
 import importlib
 import importlib.metadata
-import json
 import logging
 import os
+import re
 import subprocess
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Set, Tuple
+from typing import List, Dict, Optional, Set, Tuple
 
-import pip
+import ijson
+import orjson
+
+
+def parse_log_level(name: any) -> Optional[int]:
+    # Level number for a level name, e.g. "debug" -> 10, or None if unknown
+    level = logging.getLevelName(str(name).upper())
+    return level if isinstance(level, int) else None
+
+
+# Log level from environment, e.g. LOG_LEVEL=DEBUG for verbose output
+# If not set, the level from config (logger.level) is applied once the config is loaded
+log_level: Optional[int] = parse_log_level(os.environ.get("LOG_LEVEL", "INFO"))
 
 logging.basicConfig(
-    level=logging.DEBUG
+    level=logging.INFO if log_level is None else log_level
 )
 
 logger: logging.Logger = logging.getLogger("license-collector")
 
+if log_level is None:
+    logger.warning("Unknown log level in LOG_LEVEL: %s. Using INFO.", os.environ["LOG_LEVEL"])
+
 config_path: str = os.path.join("config", "config.json")
 config: Dict[str, any]
 
+# Index of installed packages: normalized name -> (version, license)
+# Built once in the main process and passed to the package file worker processes
+distributions: Dict[str, Tuple[Optional[str], Optional[str]]]
+
 TYPE_PYREQ: str = "py-req"
 TYPE_NODEPKG: str = "node-pkg"
 
+# package.json keys listing dependencies of the package
+NPM_DEP_KEYS: Tuple[str, ...] = (
+    'dependencies',
+    'devDependencies',
+    'peerDependencies',
+    'bundledDependencies',
+    'bundleDependencies',
+    'optionalDependencies',
+)
+
+# Everything after the package name in a requirements line
+# e.g. version specifiers, extras, markers and comments
+REQ_SPEC_PATTERN: re.Pattern = re.compile(r"[\s,;#@\[=<>~!].*$")
+
+# Byte order marks of requirements files and the matching text encoding
+# NOTE: the utf-16 codec reads the BOM itself to pick the byte order
+BOM_ENCODINGS: Tuple[Tuple[bytes, str], ...] = (
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+)
+
+# Directories not descended into when searching for package files
+# Installed dependencies would only produce false positives
+SKIP_DIRS: List[str] = ['node_modules', '.git', '.venv', 'venv', '__pycache__', 'dist', 'build', '.tox']
+
+# Max parallel package metadata lookups (I/O bound)
+META_WORKERS: int = 16
+
+# Default pip install output log, if not set in config
+PIP_INSTALL_LOG: str = "./result/pip-install.log"
+
+# Default license counts output of license-checker, if not set in config
+NPM_OUTPUT_SUMMARY: str = "./result/npm-output-summary.json"
+
+# Default npm install output log, if not set in config
+NPM_INSTALL_LOG: str = "./result/npm-install.log"
+
+# Max packages per npm install command, keeps the command line below OS limits
+NPM_INSTALL_BATCH: int = 500
+
 
 def log_error(err, *args, **kwargs):
-    logging.error(f"ERROR: {err} {args} {kwargs}")
+    logging.error("ERROR: %s %s %s", err, args, kwargs)
 
 
+@lru_cache(maxsize=None)
 def load_config(path: str) -> Dict[str, any]:
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return orjson.loads(Path(path).read_bytes())
     except Exception as ex:
-        logger.exception(f"Could not parse Config from Path: {path}", exc_info=ex)
+        logger.exception("Could not parse Config from Path: %s", path, exc_info=ex)
         raise
 
 
-# To support older Python versions
-def find_recursive_old(path: str, filename: str) -> List[str]:
-    logger.debug(f"Find file: {filename} in: {path}")
-    matches = []
-    for root, dirs, files in os.walk(path, topdown=True, onerror=log_error, followlinks=False):
-        if filename.lower() in [name.lower() for name in files]:
-            logger.debug(f"FOUND: {filename} in: {files}")
-            matches.append(os.path.join(root, files[files.index(filename)]))
-    return matches
-
+@lru_cache(maxsize=None)
+def list_dir(path: str, mtime_ns: int) -> List[os.DirEntry]:
+    # Directory listings cached during collection, e.g. for locations sharing subtrees
+    # Modification time as part of the key invalidates the listing if the dir changes
+    with os.scandir(path) as it:
+        return list(it)
 
-def find_recursive(path: str, file_glob: str) -> List[Path]:
-    logger.debug(f"Find file: {file_glob} in: {path}")
-    return [file for file in Path(path).rglob(file_glob)]
 
-
-def collect_files() -> List[Dict[str, str]]:
+def find_recursive(path: str, names: Dict[str, str], globs: List[Tuple[str, str]],
+                   skip: Set[str]) -> List[Dict[str, str]]:
+    # Walk the tree once and match every file against all package file patterns
+    # names: plain lowercased file name -> type, globs: (lowercased pattern, type)
+    # skip: directory names that are not descended into
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Find files: %s in: %s", list(names) + [g for g, _ in globs], path)
     results = []
-    # Go through each path and find the file recursively
-    for name, path in config['locations'].items():
-        # For each filename in package files list
-        for file in config['files']:
-            targets = find_recursive(path, file['name'])
-            logger.debug(f"FILES: {targets}")
-            if len(targets) > 0:
-                for tgt in targets:
-                    results.append({'path': str(tgt), 'type': file['type']})
+    stack = [path]
+    while stack:
+        try:
+            current = stack.pop()
+            entries = list_dir(current, os.stat(current).st_mtime_ns)
+        except OSError as ex:
+            log_error(ex)
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in skip:
+                        stack.append(entry.path)
+                    continue
+                if not entry.is_file():
+                    continue
+            except OSError as ex:
+                log_error(ex)
+                continue
+            name = entry.name.lower()
+            ftype = names.get(name)
+            if ftype is None:
+                ftype = next((t for g, t in globs if fnmatch.fnmatchcase(name, g)), None)
+            if ftype is not None:
+                results.append({'path': entry.path, 'type': ftype})
     return results
 
 
-text_chars = bytearray({7, 8, 9, 10, 12, 13, 27} | set(range(0x20, 0x100)) - {0x7f})
+@lru_cache(maxsize=None)
+def file_patterns(files: Tuple[Tuple[str, str], ...]) -> Tuple[Dict[str, str], List[Tuple[str, str]]]:
+    # Split package file patterns into plain names (dict lookup) and wildcards
+    names: Dict[str, str] = {}
+    globs: List[Tuple[str, str]] = []
+    for name, ftype in files:
+        pattern = name.lower()
+        if any(c in pattern for c in "*?["):
+            globs.append((pattern, ftype))
+        else:
+            names.setdefault(pattern, ftype)
+    return names, globs
+
+
+def collect_files() -> List[Dict[str, str]]:
+    files_cfg: List[Dict[str, str]] = config['files']
+    locations: Dict[str, str] = config['locations']
 
+    names, globs = file_patterns(tuple((file['name'], file['type']) for file in files_cfg))
+    skip: Set[str] = set(config.get('skip_dirs', SKIP_DIRS))
+
+    results = []
+    # Locations might overlap, set of found paths keeps the files unique
+    seen: Set[str] = set()
+    # Go through each path and find the files recursively
+    for name, path in locations.items():
+        targets = find_recursive(path, names, globs, skip)
+        logger.debug("FILES: %s", targets)
+        for tgt in targets:
+            key = os.path.normcase(os.path.abspath(tgt['path']))
+            if key not in seen:
+                seen.add(key)
+                results.append(tgt)
+
+    # Listings not needed after collection, free the memory
+    list_dir.cache_clear()
+    return results
 
-def is_binary_string(bts):
-    return bool(bts.translate(None, text_chars))
 
+def detect_encoding(path: str) -> str:
+    # Sniff the byte order mark, e.g. PowerShell redirects write UTF-16 files
+    with open(path, "rb") as fh:
+        head = fh.read(4)
+    for bom, encoding in BOM_ENCODINGS:
+        if head.startswith(bom):
+            return encoding
+    return "utf-8"
+
+
+def read_package_json(path: str, keys: Set[str]) -> Dict[str, any]:
+    # Stream through the package json file and only build the requested top-level keys
+    # Everything else (scripts, config blobs, ..) is skipped without materializing
+    content: Dict[str, any] = {}
+    builder = None
+    with open(path, "rb") as f:
+        for prefix, event, value in ijson.parse(f, use_float=True):
+            if prefix == "":
+                if builder is not None:
+                    content[key] = builder.value
+                    builder = None
+                    # All requested keys found, rest of the file not needed
+                    if len(content) == len(keys):
+                        break
+                if event == "map_key" and value in keys:
+                    key = value
+                    builder = ijson.common.ObjectBuilder()
+            elif builder is not None:
+                builder.event(event, value)
+    return content
+
+
+def exec_cmd(args: List[str], capture: bool = True, output: any = None,
+             env: Optional[Dict[str, str]] = None, log_to: Optional[Path] = None) -> subprocess.CompletedProcess:
+    if log_to is not None:
+        # Append the (possibly megabytes of) output into the log file instead of memory
+        with open(log_to, "a", encoding="utf-8") as lf:
+            return exec_cmd(args, capture=False, output=lf, env=env)
 
-def exec_cmd(args: List[str], capture: bool = True, output: any = None) -> subprocess.CompletedProcess:
     if not capture and output is None:
         raise ReferenceError("Output capture requested but No capture output was given.")
 
@@ -80,24 +230,35 @@ def exec_cmd(args: List[str], capture: bool = True, output: any = None) -> subpr
         'capture_output': False,
         'text': True,
         'stdout': output,
-        'stderr': subprocess.STDOUT
+        'stderr': subprocess.STDOUT,
+        'env': env
     }
 
     # NOTE: subprocess.call is part of older Python 3.5 API
     # and is only available due to backwards compatibility
     # Thus, use subprocess.run instead!
     try:
-        logger.debug(f"Executing command: {args}")
-        res = subprocess.run(args, capture_output=True, text=True) if capture else subprocess.run(args, **capture_args)
+        logger.debug("Executing command: %s", args)
+        res = subprocess.run(args, capture_output=True, text=True, env=env) if capture \
+            else subprocess.run(args, **capture_args)
         if res.returncode != 0:
-            logger.error(f"ERROR: CMD Return code not SUCCESS: {args} STDOUT: {res.stdout} STDERR: {res.stderr}")
+            if capture:
+                logger.error("ERROR: CMD Return code not SUCCESS: %s STDOUT: %s STDERR: %s",
+                             args, res.stdout, res.stderr)
+            else:
+                # Output went to the given file, point the user there
+                logger.error("ERROR: CMD Return code not SUCCESS: %s See output in: %s",
+                             args, getattr(output, 'name', output))
             raise SystemError(f"Command return code was not SUCCESS for command: {args}")
         return res
+    except SystemError:
+        # Already logged above
+        raise
     except FileNotFoundError as ex:
-        logger.error("ERROR: npm was not found. Ensure npm (Node.js runtime) is installed on the system.")
+        logger.error("ERROR: %s was not found. Ensure it is installed and available through PATH.", args[0])
         raise ex
     except Exception as ex:
-        logger.error(f"ERROR: Caught unexpected exception during command run. Command: {args}", exc_info=ex)
+        logger.error("ERROR: Caught unexpected exception during command run. Command: %s", args, exc_info=ex)
         raise ex
 
 
@@ -118,102 +279,174 @@ def setup_node_tools():
     logger.info("Tools installation done.")
 
 
-def process_package_files(files: List[Dict[str, str]]) -> Tuple[List[Dict[str, any]], Dict[str, int]]:
-    results: List[Dict[str, any]] = []
+def install_requirements(files: List[Dict[str, str]]) -> None:
+    # Install the packages of every requirements file in a single pip run
+    # Avoids paying the pip startup and resolver cost once per file
+    # If the batched run fails, e.g. conflicting pins across files, fall back to one run per file
+    paths: List[str] = [file['path'] for file in files if file['type'] == TYPE_PYREQ]
+    if len(paths) == 0:
+        return
 
-    for file in files:
-        path: str = file['path']
-        ftype: str = file['type']
+    # Install output is huge, written into log file instead of memory
+    log_path: Path = Path(config.get('pip_install_log', PIP_INSTALL_LOG))
+    log_path.write_text("", encoding="utf-8")
+    logger.info("Installing Python requirements. Writing install output to: %s", log_path)
 
-        result: Dict[str, any] = {'path': path, 'type': ftype, 'packages': []}
-
-        # For python requirements
-        # Install all the packages in req file
-        # Scan through all packages and fetch the license field
-        if ftype == TYPE_PYREQ:
-            logger.debug("IS PYTHON PACKAGE FILE!")
-            # pip install -r requirements.txt into VENV
-            pip.main(['install', '-r', path])
-            if is_binary_string(open(path, 'rb').read(1024)):
-                logger.warning("Target is possibly binary file. Trying UTF-16.")
-
-                def read_lines():
-                    with open(path, "r", encoding="utf-16") as f16:
-                        return f16.read().split("\n")
-            else:
-                def read_lines():
-                    with open(path, "r", encoding="utf-8") as f8:
-                        return f8.readlines()
-
-            for line in read_lines():
-                line = line.strip("\r\n").strip("\r").strip("\n").strip("\t").strip(" ")
-                pkg = line.split(",")[0].split("==")[0].split(">=")[0].split("~=")[0].split("!=")[0]
-                # Skip empty lines
-                if pkg == "":
-                    continue
-                try:
-                    meta = importlib.metadata.metadata(pkg)
-                    # Returns value in dict or None if key not found
-                    ver = meta['Version']
-                    lic = meta['License']
-                    result['packages'].append({'name': pkg, 'meta': True, 'version': ver, 'license': lic})
-                except Exception as ex:
-                    logger.exception(f"ERROR: Failed to read package meta for: {pkg}", exc_info=ex)
-                    result['packages'].append({'name': pkg, 'meta': False, 'version': None, 'license': None})
-            results.append(result)
-
-        elif ftype == TYPE_NODEPKG:
-            logger.debug("IS NODE PACKAGE FILE!")
-            if not path.endswith(".json"):
-                raise ValueError("INVALID JSON FILE!")
-            with open(path, "r", encoding="utf-8") as nf:
-                content: Dict[str, any] = json.load(nf)
-
-            name = content['name'] if 'name' in content else None
-            ver = content['version'] if 'version' in content else None
-            lic = content['license'] if 'license' in content else None
-
-            if name is None:
-                logger.debug("Package json file missing attribute NAME.")
-
-            result['packages'].append({'name': name, 'version': ver, 'license': lic})
-            results.append(result)
-
-        elif type == "ANY_OTHER_PACKAGE_TYPE":
-            # Define other package type parsing here
-            pass
+    # Run pip in a separate process instead of the private pip.main API
+    # Skip the version check and prompts on startup
+    env = {**os.environ, 'PIP_DISABLE_PIP_VERSION_CHECK': '1', 'PIP_NO_INPUT': '1'}
+    pip: List[str] = [sys.executable, "-m", "pip", "install"]
+    try:
+        # pip install -r req1.txt -r req2.txt .. into VENV
+        res = exec_cmd(pip + [arg for path in paths for arg in ('-r', path)], env=env, log_to=log_path)
+        logger.debug("Requirements installed: %s", res)
+        return
+    except SystemError:
+        if len(paths) == 1:
+            logger.error("ERROR: Failed to install requirements: %s. Continuing with the installed packages.",
+                         paths[0])
+            return
+        logger.warning("Batched requirements install failed. Installing each requirements file separately..")
+
+    for path in paths:
+        try:
+            res = exec_cmd(pip + ['-r', path], env=env, log_to=log_path)
+            logger.debug("Requirements installed: %s", res)
+        except SystemError:
+            # Packages not installed show up without meta in the results
+            logger.error("ERROR: Failed to install requirements: %s. Continuing with the installed packages.", path)
+
+
+def normalize_package_name(name: str) -> str:
+    # PEP 503 normalized form, e.g. Foo_Bar.baz -> foo-bar-baz
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def read_distribution_meta(dist: importlib.metadata.Distribution) -> Tuple[Optional[str], ...]:
+    meta = dist.metadata
+    # Returns value in dict or None if key not found
+    return meta['Name'], meta['Version'], meta['License']
+
+
+def index_distributions() -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+    # Walk sys.path for installed distributions once
+    # instead of re-scanning it for every looked up package
+    # Only plain values kept, cheap to pass on to the worker processes
+    index: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+    # Threads overlap reading each package's METADATA file
+    with ThreadPoolExecutor(max_workers=META_WORKERS) as ex:
+        for name, ver, lic in ex.map(read_distribution_meta, importlib.metadata.distributions()):
+            # Broken installs might lack the name
+            if name is not None:
+                index.setdefault(normalize_package_name(name), (ver, lic))
+    return index
+
+
+def read_package_meta(pkg: str, dists: Dict[str, Tuple[Optional[str], Optional[str]]]) -> Dict[str, any]:
+    try:
+        meta = dists.get(normalize_package_name(pkg))
+        if meta is None:
+            raise importlib.metadata.PackageNotFoundError(pkg)
+        ver, lic = meta
+        return {'name': pkg, 'meta': True, 'version': ver, 'license': lic}
+    except Exception as ex:
+        logger.exception("ERROR: Failed to read package meta for: %s", pkg, exc_info=ex)
+        return {'name': pkg, 'meta': False, 'version': None, 'license': None}
 
-        else:
-            # This should never occur
-            # If happens, error in config, missing definition(s) etc.
-            logger.error("ERROR: Unknown package type!")
-            raise KeyError("Unknown package type requested.")
+
+def init_package_worker(dists: Dict[str, Tuple[Optional[str], Optional[str]]]):
+    global distributions
+    distributions = dists
+
+
+def process_package_file(file: Dict[str, str]) -> Dict[str, any]:
+    path: str = file['path']
+    ftype: str = file['type']
+
+    result: Dict[str, any] = {'path': path, 'type': ftype, 'packages': []}
+
+    # For python requirements
+    # Packages already installed in install_requirements
+    # Scan through all packages and fetch the license field
+    if ftype == TYPE_PYREQ:
+        logger.debug("IS PYTHON PACKAGE FILE!")
+        encoding: str = detect_encoding(path)
+        if encoding == "utf-16":
+            logger.debug("Target has UTF-16 BOM. Reading as UTF-16.")
+
+        lines: List[str] = Path(path).read_text(encoding=encoding, errors="replace").splitlines()
+
+        pkgs: List[str] = []
+        for line in lines:
+            pkg = REQ_SPEC_PATTERN.sub("", line.strip())
+            # Skip empty lines
+            if pkg == "":
+                continue
+            pkgs.append(pkg)
+
+        # Package meta looked up from the prebuilt index
+        result['packages'].extend(read_package_meta(pkg, distributions) for pkg in pkgs)
+
+    elif ftype == TYPE_NODEPKG:
+        logger.debug("IS NODE PACKAGE FILE!")
+        if not path.endswith(".json"):
+            raise ValueError("INVALID JSON FILE!")
+        content: Dict[str, any] = read_package_json(path, {'name', 'version', 'license'})
+
+        name = content['name'] if 'name' in content else None
+        ver = content['version'] if 'version' in content else None
+        lic = content['license'] if 'license' in content else None
+
+        if name is None:
+            logger.debug("Package json file missing attribute NAME.")
+
+        result['packages'].append({'name': name, 'version': ver, 'license': lic})
+
+    elif type == "ANY_OTHER_PACKAGE_TYPE":
+        # Define other package type parsing here
+        pass
+
+    else:
+        # This should never occur
+        # If happens, error in config, missing definition(s) etc.
+        logger.error("ERROR: Unknown package type!")
+        raise KeyError("Unknown package type requested.")
+
+    return result
+
+
+def process_package_files(files: List[Dict[str, str]]) -> Tuple[List[Dict[str, any]], Dict[str, int]]:
+    # Packages must be installed before their metadata can be read
+    # Installing is done once here, before the files are processed in parallel
+    install_requirements(files)
+
+    # Index the installed packages once (after the install) and hand it to every worker
+    # Index only needed for requirements files, node package files carry their own meta
+    has_reqs: bool = any(file['type'] == TYPE_PYREQ for file in files)
+    dists: Dict[str, Tuple[Optional[str], Optional[str]]] = index_distributions() if has_reqs else {}
+
+    # No more workers than files to process
+    workers: int = max(1, min(len(files), os.cpu_count() or 1))
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_package_worker, initargs=(dists,)) as ex:
+        results: List[Dict[str, any]] = list(ex.map(process_package_file, files))
 
     # Generate a summary of all licenses in results
     # And add as a part of the output
-    summary: Dict[str, int] = {'NONE': 0}
-
+    # Missing or empty license counted as NONE
+    counts: Counter = Counter()
     for res in results:
-        for pkg in res['packages']:
-            if 'license' not in pkg:
-                summary['NONE'] += 1
-                continue
-            lic = pkg['license']
-            if lic is None or lic == "":
-                summary['NONE'] += 1
-            if lic not in summary:
-                summary[lic] = 1
-            else:
-                summary[lic] += 1
+        counts.update(pkg.get('license') or 'NONE' for pkg in res['packages'])
 
     # Order licenses Descending by count (license with most uses first)
-    summary = {k: v for k, v in sorted(summary.items(), key=lambda it: it[1], reverse=True)}
+    summary: Dict[str, int] = dict(counts.most_common())
 
     return results, summary
 
 
-def process_npm_modules(files: List[Dict[str, str]]) -> List[Dict[str, any]]:
+def process_npm_modules(files: List[Dict[str, str]]) -> Tuple[List[Dict[str, any]], Set[str]]:
     results = []
+    # Union of unique dependencies over all package files
+    all_deps: Set[str] = set()
     for file in files:
         path: str = file['path']
         ftype: str = file['type']
@@ -221,8 +454,7 @@ def process_npm_modules(files: List[Dict[str, str]]) -> List[Dict[str, any]]:
         if ftype != TYPE_NODEPKG:
             continue
 
-        with open(path, "r", encoding="utf-8") as f:
-            content: Dict[str, any] = json.load(f)
+        content: Dict[str, any] = read_package_json(path, set(NPM_DEP_KEYS))
 
         # Not every pkg file has name!!
         # name: str = content['name'] if 'name' in content else None
@@ -230,14 +462,12 @@ def process_npm_modules(files: List[Dict[str, str]]) -> List[Dict[str, any]]:
         # Collect all possible dependencies from the package json file
         # Collect also additional dependencies
         deps: Set[str] = set()
-        for key in [
-            'dependencies',
-            'devDependencies',
-            'peerDependencies'
-            'bundledDependencies',
-            'optionalDependencies',
-        ]:
-            deps.update(set(content[key].keys()) if key in content else set())
+        for key in NPM_DEP_KEYS:
+            value = content.get(key)
+            # Dependency maps (name -> version) or bundled name lists
+            # NOTE: bundledDependencies can also be a boolean (bundle all)
+            if isinstance(value, (dict, list)):
+                deps.update(value)
 
         # Collect unique package names into list
         # NOTE: done in previous stage
@@ -247,27 +477,67 @@ def process_npm_modules(files: List[Dict[str, str]]) -> List[Dict[str, any]]:
         # results.update(deps)
 
         if len(deps) > 0:
+            packages = [dep for dep in deps if dep is not None and dep != ""]
+            all_deps.update(packages)
             results.append({
                 'path': path,
                 'type': ftype,
-                'packages': [dep for dep in deps if dep is not None and dep != ""]
+                'packages': packages
             })
         else:
-            logger.warning(f"No dependencies found in package json file: {path}")
+            logger.warning("No dependencies found in package json file: %s", path)
 
-    return results
+    return results, all_deps
+
+
+def stream_npm_licenses(npx: str, path: str) -> Dict[str, int]:
+    # Stream license-checker JSON output package by package instead of loading it whole
+    # Records are written as newline delimited JSON and license counts collected on the way
+    counts: Counter = Counter()
+    args: List[str] = [npx, "license-checker", "--json"]
+    logger.debug("Executing command: %s", args)
+    with open(path, "wb") as f:
+        try:
+            with subprocess.Popen(args, stdout=subprocess.PIPE) as proc:
+                try:
+                    for pkg, info in ijson.kvitems(proc.stdout, "", use_float=True):
+                        f.write(orjson.dumps({pkg: info}) + b"\n")
+                        lic = info.get('licenses') if isinstance(info, dict) else None
+                        if isinstance(lic, list):
+                            lic = ", ".join(str(li) for li in lic)
+                        counts[lic or 'NONE'] += 1
+                except ijson.JSONError as ex:
+                    # A failed run leaves no or broken JSON, reported by the return code check below
+                    # Drain the rest of the output first, a child blocked on a full pipe never exits
+                    for _ in iter(lambda: proc.stdout.read(65536), b""):
+                        pass
+                    if proc.wait() == 0:
+                        logger.error("ERROR: Could not parse command output. Command: %s", args, exc_info=ex)
+                        raise
+        except FileNotFoundError as ex:
+            logger.error("ERROR: %s was not found. Ensure it is installed and available through PATH.", args[0])
+            raise ex
+    if proc.returncode != 0:
+        logger.error("ERROR: CMD Return code not SUCCESS: %s", args)
+        raise SystemError(f"Command return code was not SUCCESS for command: {args}")
+
+    # Order licenses Descending by count (license with most uses first)
+    return dict(counts.most_common())
 
 
 def scan_npm_licenses(files: List[Dict[str, str]], results: List[dict]) -> None:
-    modules: List[Dict[str, any]] = process_npm_modules(files)
+    modules, packages = process_npm_modules(files)
 
     # Required NPM binaries
     npm: str = config['bins']['npm']
     npx: str = config['bins']['npx']
 
-    # Provided as pipe to --json argument
+    # Output of --json argument, streamed as newline delimited JSON
     lic_path: str = config['node_output']
 
+    # License counts collected while streaming the --json output
+    lic_sum_path: str = config.get('node_output_summary', NPM_OUTPUT_SUMMARY)
+
     # Summary from --summary is plain text so piped into .txt file
     sum_path: str = config['node_summary']
 
@@ -281,22 +551,27 @@ def scan_npm_licenses(files: List[Dict[str, str]], results: List[dict]) -> None:
     # TODO NOTE: Running installs one package at a time is extremely slow! Using bundled installation instead
     # for mod in modules:
     #     try:
-    #         logger.debug(f"Installing module: {mod}")
+    #         logger.debug("Installing module: %s", mod)
     #         res = exec_cmd(
     #             [npm, "install", "--force", "--allow-missing", "--legacy-peer-deps", mod]
     #         )
-    #         logger.debug(f"Module: {mod} installed: {res}")
+    #         logger.debug("Module: %s installed: %s", mod, res)
     #     except Exception as ex:
-    #         logger.exception(f"ERROR: Failed to install package: {mod}", exc_info=ex)
-
-    packages: Set[str] = set()
-    for mod in modules:
-        packages.update(set(mod['packages']))
-
-    res = exec_cmd(
-        [npm, "install", "--force", "--allow-missing", "--legacy-peer-deps"] + list(packages)
-    )
-    logger.debug(f"All Modules installed: {res}")
+    #         logger.exception("ERROR: Failed to install package: %s", mod, exc_info=ex)
+
+    # Install output is huge, written into log file instead of memory
+    log_path: Path = Path(config.get('node_install_log', NPM_INSTALL_LOG))
+    log_path.write_text("", encoding="utf-8")
+    logger.info("Writing install output to: %s", log_path)
+
+    # Install in batches, a single command for thousands of packages might exceed the OS argument limit
+    pkg_list: List[str] = sorted(packages)
+    for i in range(0, len(pkg_list), NPM_INSTALL_BATCH):
+        res = exec_cmd(
+            [npm, "install", "--force", "--allow-missing", "--legacy-peer-deps"] + pkg_list[i:i + NPM_INSTALL_BATCH],
+            log_to=log_path
+        )
+        logger.debug("Modules installed: %s", res)
     logger.info("All node modules installed.")
 
     # After installing all packages, ensure tools installed & up to date
@@ -305,16 +580,16 @@ def scan_npm_licenses(files: List[Dict[str, str]], results: List[dict]) -> None:
     # Run the crawler on node_modules
     # After, crawl through the installed modules for licenses
     logger.info("Crawling through licenses..")
-    with open(lic_path, "w", encoding="utf-8") as f:
-        out = exec_cmd([npx, "license-checker", "--json"], capture=False, output=f)
-    logger.debug(f"RESULT: {out}")
+    counts: Dict[str, int] = stream_npm_licenses(npx, lic_path)
+    dump_json(counts, lic_sum_path)
+    logger.debug("RESULT: %s", counts)
     logger.info("Crawling done. Licenses written.")
 
     # Collect a separate summary of licenses
     logger.info("Collect license summary..")
     with open(sum_path, "w", encoding="utf-8") as f:
         out = exec_cmd([npx, "license-checker", "--summary"], capture=False, output=f)
-    logger.debug(f"RESULT: {out}")
+    logger.debug("RESULT: %s", out)
     logger.info("Summary written.")
 
 
@@ -324,14 +599,29 @@ def process_license_info(data: List[Dict[str, str]]):
 
 
 def dump_json(data: any, path: str):
-    # Open output file to be written
-    with open(path, "w", encoding="utf-8") as of:
-        json.dump(data, of, indent=2)
+    # Write the output file in one go
+    # Non-str keys allowed, e.g. a numeric package.json license counted in summary
+    Path(path).write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+
+
+def setup_log_level():
+    # Environment variable takes precedence over the config
+    if "LOG_LEVEL" in os.environ or 'logger' not in config or 'level' not in config['logger']:
+        return
+    name = config['logger']['level']
+    level = parse_log_level(name)
+    if level is None:
+        logger.warning("Unknown log level in config: %s. Using INFO.", name)
+        return
+    logging.getLogger().setLevel(level)
+    # Worker processes started without fork re-read the level from the environment
+    os.environ["LOG_LEVEL"] = logging.getLevelName(level)
 
 
 def main():
     global config
     config = load_config(config_path)
+    setup_log_level()
 
     files: List[Dict[str, str]] = collect_files()
 